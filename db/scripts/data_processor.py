@@ -8,7 +8,9 @@ Excel/CSVファイルを監視し、データを抽出してPostgreSQLに格納
 import os
 import sys
 import time
-from datetime import datetime, timezone
+import socket
+import threading
+from datetime import datetime, date, time as dt_time, timedelta
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import logging
@@ -21,6 +23,7 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 import openpyxl
 from pydantic import BaseModel, validator, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from loguru import logger
 import traceback
 
@@ -35,8 +38,11 @@ logger.add("logs/iot_processor.log", rotation="1 day",
 # ===============================================
 
 
-class Config(BaseModel):
-    """アプリケーション設定"""
+class Config(BaseSettings):
+    """アプリケーション設定（環境変数・.envから読み込み）"""
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
     # データベース接続
     db_host: str = "localhost"
     db_port: int = 5432
@@ -60,9 +66,65 @@ class Config(BaseModel):
     time_column: str = "B"  # 時間列
     tag_start_column: str = "D"  # タグ開始列
     tag_column_interval: int = 2  # タグ列の間隔
+    source_timezone: str = "Asia/Tokyo"  # ロガーが記録する日時のタイムゾーン
+
+    # 複数インスタンス（ファイル排他・MV更新リーダー選出）
+    instance_id: str = Field(
+        default_factory=lambda: f"{socket.gethostname()}-{os.getpid()}")
+    claim_lease_seconds: int = 60  # ファイル占有のリース期間
+    heartbeat_interval: int = 15  # リース延長の間隔（秒）
+    claim_sweep_interval: int = 30  # 未処理・期限切れファイルの再走査間隔（秒）
+    file_settle_seconds: int = 2  # 書き込み完了とみなす最終更新からの経過秒
+    mv_refresh_interval: int = 60  # リーダーによるMV更新の最小間隔（秒）
+    mv_refresh_lock_key: int = 20250001  # MV更新リーダーのアドバイザリロックキー
+
+    @validator('heartbeat_interval')
+    def validate_heartbeat_interval(cls, v, values):
+        lease = values.get('claim_lease_seconds')
+        if lease is not None and v >= lease:
+            raise ValueError(f"heartbeat_intervalはclaim_lease_seconds（{lease}）未満にしてください")
+        return v
+
+    @validator('source_timezone')
+    def validate_source_timezone(cls, v):
+        # 不正なタイムゾーンは起動時に検出する（変換時だと全ファイルがエラー扱いになる）
+        try:
+            pd.Timestamp(0).tz_localize(v)
+        except Exception:
+            raise ValueError(f"不正なタイムゾーン: {v}")
+        return v
+
+# ===============================================
+# 取込時集計
+# ===============================================
+
+# 集計テーブル名 -> バケット幅（view.sqlのMVが参照するため設定ではなく固定）
+AGGREGATE_TABLES = {
+    "agg_measurements_1min": "1min",
+    "agg_measurements_5min": "5min",
+}
+
+
+def build_partial_aggregates(rows: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """(タグ, バケット)単位の部分集計を作成
 
-    class Config:
-        env_file = ".env"
+    件数・平均・偏差平方和(M2)・最小・最大を保持し、Chanの並列公式でマージする。
+    rowsは timestamp, tag_id, value 列を持つ新規行のみ。
+    """
+    partial_aggregates = {}
+    for table, freq in AGGREGATE_TABLES.items():
+        grouped = (
+            rows.assign(time_bucket=rows['timestamp'].dt.floor(freq))
+            .groupby(['time_bucket', 'tag_id'], sort=False)['value']
+        )
+        partials = grouped.agg(sample_count='size', mean_value='mean',
+                               min_value='min', max_value='max')
+        partials['m2_value'] = grouped.var(ddof=0) * partials['sample_count']
+        partial_aggregates[table] = partials[
+            ['sample_count', 'mean_value', 'm2_value', 'min_value', 'max_value']
+        ].reset_index()
+
+    return partial_aggregates
 
 # ===============================================
 # データモデル
@@ -93,6 +155,7 @@ class DatabaseManager:
         self.config = config
         self.conn = None
         self.tag_cache = {}  # tag_code -> tag_id のキャッシュ
+        self.lock = threading.RLock()  # 監視スレッドとメインスレッドで接続を共有するため
 
     def connect(self):
         """データベース接続"""
@@ -138,61 +201,609 @@ class DatabaseManager:
         return self.tag_cache.get(tag_code)
 
     def insert_measurements(self, measurements: List[MeasurementData]):
-        """測定データの一括挿入"""
+        """測定データの一括挿入と部分集計の更新（同一トランザクション）
+
+        部分集計には新規行だけを加算する。同じ値の再取込は集計に影響せず、
+        値が変わった行のバケットは測定データから再計算する。
+        """
         if not measurements:
             return
 
+        # データを準備（同一バッチ内の重複キーは後の値を採用）
+        data = list({
+            (m.timestamp, m.tag_id): (m.timestamp, m.tag_id, m.value)
+            for m in measurements
+        }.values())
+
+        with self.lock:
+            try:
+                with self.conn.cursor() as cur:
+                    # 一括挿入（高速）
+                    inserted = execute_values(
+                        cur,
+                        """
+                        INSERT INTO measurements (timestamp, tag_id, value)
+                        VALUES %s
+                        ON CONFLICT (timestamp, tag_id) DO NOTHING
+                        RETURNING timestamp, tag_id, value
+                        """,
+                        data,
+                        template="(%s, %s, %s)",
+                        fetch=True
+                    )
+
+                    # 既存行は値が変わったものだけ更新
+                    updated = []
+                    if len(inserted) < len(data):
+                        updated = execute_values(
+                            cur,
+                            """
+                            UPDATE measurements AS m
+                            SET value = v.value
+                            FROM (VALUES %s) AS v (timestamp, tag_id, value)
+                            WHERE m.timestamp = v.timestamp
+                              AND m.tag_id = v.tag_id
+                              AND m.value IS DISTINCT FROM v.value
+                            RETURNING m.timestamp, m.tag_id
+                            """,
+                            data,
+                            template="(%s::timestamptz, %s::int, %s::double precision)",
+                            fetch=True
+                        )
+
+                    self._update_partial_aggregates(cur, inserted, updated)
+
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                logger.error(f"データ挿入エラー: {e}")
+                raise
+
+        logger.info(f"{len(measurements)}件のデータを処理しました"
+                    f"（新規{len(inserted)}件, 更新{len(updated)}件）")
+
+    def _update_partial_aggregates(self, cur, inserted: List[tuple], updated: List[tuple]):
+        """部分集計の更新（新規行はマージ、値が変わった行のバケットは再計算）"""
+        inserted_rows = pd.DataFrame(inserted, columns=['timestamp', 'tag_id', 'value'])
+        inserted_rows['timestamp'] = pd.to_datetime(inserted_rows['timestamp'], utc=True)
+        updated_rows = pd.DataFrame(updated, columns=['timestamp', 'tag_id'])
+        updated_rows['timestamp'] = pd.to_datetime(updated_rows['timestamp'], utc=True)
+
+        # マージ・再計算の前に対象バケットのロックを取得
+        self._lock_aggregate_buckets(
+            cur, pd.concat([inserted_rows[['timestamp', 'tag_id']], updated_rows]))
+
+        for table, partials in build_partial_aggregates(inserted_rows).items():
+            freq = AGGREGATE_TABLES[table]
+            stale = (
+                updated_rows.assign(time_bucket=updated_rows['timestamp'].dt.floor(freq))
+                [['time_bucket', 'tag_id']].drop_duplicates()
+            )
+
+            # 再計算するバケットは加算しない（再計算に新規行も含まれる）
+            if not stale.empty:
+                keys = pd.MultiIndex.from_frame(partials[['time_bucket', 'tag_id']])
+                partials = partials[~keys.isin(pd.MultiIndex.from_frame(stale))]
+
+            self._merge_partial_aggregates(cur, table, partials)
+            self._recompute_partial_aggregates(cur, table, freq, stale)
+
+    def _lock_aggregate_buckets(self, cur, rows: pd.DataFrame):
+        """(タグ, 最大幅のバケット)単位のアドバイザリロックをキー順に取得（コミットまで保持）
+
+        再計算のSELECTは文の開始時点のスナップショットを使うため、他インスタンスが
+        同じバケットへ未コミットのマージをしていると、その行を取りこぼして上書きする。
+        マージと再計算が同じロックを取ることで、再計算は相手のコミット後に実行される。
+        各バケット幅は最大幅を割り切るので、1分・5分の両テーブルを1つのロックで守れる。
+        """
+        if rows.empty:
+            return
+
+        window = max((pd.Timedelta(freq) for freq in AGGREGATE_TABLES.values()))
+        keys = pd.DataFrame({
+            'tag_id': rows['tag_id'].astype(np.int64),
+            'bucket_no': (rows['timestamp'] - pd.Timestamp(0, tz='UTC')) // window,
+        }).drop_duplicates().sort_values(['tag_id', 'bucket_no'])
+
+        # デッドロックを避けるため、全インスタンスで同じ順序（キー昇順）に取得する
+        cur.execute(
+            """
+            SELECT COUNT(pg_advisory_xact_lock(k.tag_id, k.bucket_no))
+            FROM unnest(%s::int[], %s::int[]) AS k (tag_id, bucket_no)
+            """,
+            (keys['tag_id'].tolist(), keys['bucket_no'].tolist())
+        )
+
+    def _merge_partial_aggregates(self, cur, table: str, partials: pd.DataFrame):
+        """部分集計のマージ（Chanの並列公式で平均・M2を結合、最小・最大は比較）"""
+        if partials.empty:
+            return
+
+        data = [
+            (bucket.to_pydatetime(), int(tag_id), int(count),
+             float(mean_value), float(m2_value),
+             float(min_value), float(max_value))
+            for bucket, tag_id, count, mean_value, m2_value, min_value, max_value
+            in partials.itertuples(index=False, name=None)
+        ]
+
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO {table} (time_bucket, tag_id, sample_count,
+                                 mean_value, m2_value, min_value, max_value)
+            VALUES %s
+            ON CONFLICT (time_bucket, tag_id) DO UPDATE
+            SET sample_count = {table}.sample_count + EXCLUDED.sample_count,
+                mean_value = {table}.mean_value
+                    + (EXCLUDED.mean_value - {table}.mean_value)
+                    * EXCLUDED.sample_count::DOUBLE PRECISION
+                    / ({table}.sample_count + EXCLUDED.sample_count),
+                m2_value = {table}.m2_value + EXCLUDED.m2_value
+                    + (EXCLUDED.mean_value - {table}.mean_value) ^ 2
+                    * {table}.sample_count::DOUBLE PRECISION * EXCLUDED.sample_count
+                    / ({table}.sample_count + EXCLUDED.sample_count),
+                min_value = LEAST({table}.min_value, EXCLUDED.min_value),
+                max_value = GREATEST({table}.max_value, EXCLUDED.max_value)
+            """,
+            data,
+            template="(%s, %s, %s, %s, %s, %s, %s)"
+        )
+        logger.debug(f"{len(data)}件の部分集計をマージしました: {table}")
+
+    def _recompute_partial_aggregates(self, cur, table: str, freq: str, buckets: pd.DataFrame):
+        """値が変わったバケットの部分集計を測定データから再計算"""
+        if buckets.empty:
+            return
+
+        bucket_seconds = int(pd.Timedelta(freq).total_seconds())
+        data = [
+            (bucket.to_pydatetime(), int(tag_id))
+            for bucket, tag_id in buckets.itertuples(index=False, name=None)
+        ]
+
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO {table} (time_bucket, tag_id, sample_count,
+                                 mean_value, m2_value, min_value, max_value)
+            SELECT
+                v.time_bucket,
+                v.tag_id,
+                COUNT(*),
+                AVG(m.value),
+                VAR_POP(m.value) * COUNT(*),
+                MIN(m.value),
+                MAX(m.value)
+            FROM (VALUES %s) AS v (time_bucket, tag_id)
+            JOIN measurements m
+              ON m.tag_id = v.tag_id
+             AND m.timestamp >= v.time_bucket
+             AND m.timestamp < v.time_bucket + INTERVAL '{bucket_seconds} seconds'
+            GROUP BY v.time_bucket, v.tag_id
+            ON CONFLICT (time_bucket, tag_id) DO UPDATE
+            SET sample_count = EXCLUDED.sample_count,
+                mean_value = EXCLUDED.mean_value,
+                m2_value = EXCLUDED.m2_value,
+                min_value = EXCLUDED.min_value,
+                max_value = EXCLUDED.max_value
+            """,
+            data,
+            template="(%s::timestamptz, %s::int)"
+        )
+        logger.debug(f"{len(data)}件の部分集計を再計算しました: {table}")
+
+    def refresh_materialized_views(self):
+        """マテリアライズドビューの更新"""
+        with self.lock:
+            try:
+                with self.conn.cursor() as cur:
+                    # 優先度順に更新
+                    views_to_refresh = [
+                        'mv_power_1min',
+                        'mv_temp_1min',
+                        'mv_humid_5min',
+                        'mv_temp_5min',
+                        'mv_integrated_power_30min'
+                    ]
+
+                    for view in views_to_refresh:
+                        cur.execute(
+                            f"REFRESH MATERIALIZED VIEW {view}")
+                        logger.info(f"更新完了: {view}")
+
+                self.conn.commit()
+            except Exception as e:
+                logger.error(f"MV更新エラー: {e}")
+                self.conn.rollback()
+
+# ===============================================
+# ファイル排他制御クラス（複数インスタンス）
+# ===============================================
+
+
+class LeaseLostError(Exception):
+    """ファイル占有のリースを失った（他インスタンスが再占有した可能性がある）"""
+
+
+class ClaimManager:
+    """file_claimsテーブルによるファイル占有とMV更新リーダー選出
+
+    占有はリース方式で、処理中はハートビートで延長する。
+    インスタンスが停止するとリースが失効し、他のインスタンスが再占有する。
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.instance_id = config.instance_id
+        self.conn = None
+        self.lock = threading.Lock()
+        self.is_leader = False
+        self.lease_deadlines = {}  # 処理中のfile_key -> リース期限（time.monotonic基準）
+        self.lost_claims = set()  # ハートビートで失効が判明したfile_key
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = None
+
+    def connect(self):
+        """占有管理用の接続（ハートビートが処理中のトランザクションに干渉しないよう別接続）"""
+        with self.lock:
+            self._open_connection()
+        logger.info(f"占有管理を開始しました: instance_id={self.instance_id}")
+
+        self._heartbeat_stop.clear()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name="claim-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def disconnect(self):
+        """占有管理の停止（セッション終了でリーダーロックも解放される）"""
+        self._heartbeat_stop.set()
+        if self._heartbeat_thread:
+            self._heartbeat_thread.join()
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.is_leader = False
+                logger.info("占有管理の接続を切断しました")
+
+    def _open_connection(self):
+        """接続を開く（lock取得済みで呼ぶ）"""
+        try:
+            self.conn = psycopg2.connect(
+                host=self.config.db_host,
+                port=self.config.db_port,
+                database=self.config.db_name,
+                user=self.config.db_user,
+                password=self.config.db_password
+            )
+            self.conn.autocommit = True
+        except Exception as e:
+            logger.error(f"占有管理の接続エラー: {e}")
+            raise
+
+    def _execute(self, query: str, params: tuple = None) -> List[tuple]:
+        """SQLを実行して結果行を返す（接続が切れていれば再接続）"""
+        with self.lock:
+            if self.conn is None or self.conn.closed:
+                logger.warning("占有管理の接続を再接続します")
+                self._open_connection()
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute(query, params)
+                    return cur.fetchall() if cur.description else []
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # セッションが切れたためリーダーロックも失われている
+                self.conn.close()
+                if self.is_leader:
+                    logger.warning("接続断によりMV更新リーダーを退任しました")
+                self.is_leader = False
+                raise
+
+    @staticmethod
+    def file_key(file_path: str) -> str:
+        """ファイル識別子（名前・サイズ・更新時刻）"""
+        stat = Path(file_path).stat()
+        return f"{Path(file_path).name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def claim(self, file_path: str) -> Optional[str]:
+        """ファイルを占有（未占有・処理完了済み・リース失効時のみ成功）
+
+        状態の記録はファイル移動後に行うため、処理完了済み（done/error）の識別子が
+        監視フォルダに再び現れるのは、再投入されたかエラーフォルダへの移動に失敗した場合。
+        どちらも再処理する（取込は冪等）。
+        """
         try:
-            with self.conn.cursor() as cur:
-                # データを準備
-                data = [
-                    (m.timestamp, m.tag_id, m.value)
-                    for m in measurements
-                ]
-
-                # 一括挿入（高速）
-                execute_values(
-                    cur,
+            file_key = self.file_key(file_path)
+        except FileNotFoundError:
+            # 他インスタンスが処理済みで移動した
+            return None
+
+        requested_at = time.monotonic()
+        rows = self._execute(
+            """
+            WITH previous AS (
+                SELECT status FROM file_claims WHERE file_key = %s
+            )
+            INSERT INTO file_claims (file_key, file_path, instance_id, lease_expires_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+            ON CONFLICT (file_key) DO UPDATE
+            SET file_path = EXCLUDED.file_path,
+                instance_id = EXCLUDED.instance_id,
+                status = 'processing',
+                attempts = file_claims.attempts + 1,
+                claimed_at = CURRENT_TIMESTAMP,
+                heartbeat_at = CURRENT_TIMESTAMP,
+                lease_expires_at = EXCLUDED.lease_expires_at,
+                finished_at = NULL
+            WHERE file_claims.status IN ('done', 'error')
+               OR file_claims.lease_expires_at < CURRENT_TIMESTAMP
+            RETURNING attempts, (SELECT status FROM previous)
+            """,
+            (file_key, file_key, file_path, self.instance_id,
+             self.config.claim_lease_seconds)
+        )
+
+        if not rows:
+            logger.debug(f"他インスタンスが占有中: {file_path}")
+            return None
+
+        attempts, previous_status = rows[0]
+        if previous_status == 'processing':
+            logger.warning(f"リース失効ファイルを再占有: {file_path}（{attempts}回目）")
+        elif previous_status is not None:
+            logger.warning(f"処理済み（{previous_status}）のファイルを再処理: {file_path}（{attempts}回目）")
+
+        self.lost_claims.discard(file_key)
+        self.lease_deadlines[file_key] = requested_at + self.config.claim_lease_seconds
+        return file_key
+
+    def check_lease(self, file_key: str):
+        """リースを保持しているか確認（失効していればLeaseLostError）"""
+        if file_key in self.lost_claims:
+            raise LeaseLostError(f"他インスタンスに再占有されました: {file_key}")
+
+        deadline = self.lease_deadlines.get(file_key)
+        if deadline is None or time.monotonic() >= deadline:
+            # 失敗ではなく喪失として扱い、release で状態を書き換えない（他インスタンスが再占有できる）
+            self.lost_claims.add(file_key)
+            raise LeaseLostError(f"ハートビートが途絶えリースが失効しました: {file_key}")
+
+    def release(self, file_key: str, succeeded: bool):
+        """占有の解放（処理結果を記録）
+
+        リースを失った占有は processing のまま残し、リース失効後に再占有させる。
+        """
+        self.lease_deadlines.pop(file_key, None)
+        if file_key in self.lost_claims:
+            self.lost_claims.discard(file_key)
+            return
+
+        rows = self._execute(
+            """
+            UPDATE file_claims
+            SET status = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE file_key = %s AND instance_id = %s
+            RETURNING file_key
+            """,
+            ('done' if succeeded else 'error', file_key, self.instance_id)
+        )
+        if not rows:
+            logger.warning(f"占有が他インスタンスに移っていました: {file_key}")
+
+    def _heartbeat_loop(self):
+        """処理中ファイルのリース延長（延長できなかったものは失効として記録）"""
+        while not self._heartbeat_stop.wait(self.config.heartbeat_interval):
+            file_keys = list(self.lease_deadlines)
+            if not file_keys:
+                continue
+
+            requested_at = time.monotonic()
+            try:
+                rows = self._execute(
                     """
-                    INSERT INTO measurements (timestamp, tag_id, value)
-                    VALUES %s
-                    ON CONFLICT (timestamp, tag_id) DO UPDATE
-                    SET value = EXCLUDED.value
+                    UPDATE file_claims
+                    SET heartbeat_at = CURRENT_TIMESTAMP,
+                        lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE file_key = ANY(%s) AND instance_id = %s
+                      AND status = 'processing'
+                    RETURNING file_key
                     """,
-                    data,
-                    template="(%s, %s, %s)"
+                    (self.config.claim_lease_seconds, file_keys, self.instance_id)
                 )
+            except Exception as e:
+                # 延長できないままリース期限を過ぎると check_lease が失効を検出する
+                logger.error(f"ハートビートエラー: {e}")
+                continue
 
-            self.conn.commit()
-            logger.info(f"{len(measurements)}件のデータを挿入しました")
+            renewed = {row[0] for row in rows}
+            for file_key in file_keys:
+                if file_key not in self.lease_deadlines:
+                    continue  # 解放済み
+                if file_key in renewed:
+                    self.lease_deadlines[file_key] = requested_at + self.config.claim_lease_seconds
+                else:
+                    logger.warning(f"リースを失いました: {file_key}")
+                    self.lost_claims.add(file_key)
+                    self.lease_deadlines.pop(file_key, None)
 
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"データ挿入エラー: {e}")
-            raise
+    def try_become_leader(self) -> bool:
+        """MV更新リーダーの選出（セッション単位のアドバイザリロック）"""
+        if self.is_leader:
+            return True
 
-    def refresh_materialized_views(self):
-        """マテリアライズドビューの更新"""
+        rows = self._execute("SELECT pg_try_advisory_lock(%s)",
+                             (self.config.mv_refresh_lock_key,))
+        self.is_leader = rows[0][0]
+
+        if self.is_leader:
+            logger.info(f"MV更新リーダーになりました: instance_id={self.instance_id}")
+        return self.is_leader
+
+    def latest_completion(self) -> Optional[datetime]:
+        """全インスタンスで最後にファイル処理が完了した時刻"""
+        rows = self._execute("""
+            SELECT MAX(finished_at)
+            FROM file_claims
+            WHERE status = 'done'
+        """)
+        return rows[0][0]
+
+# ===============================================
+# タイムスタンプ変換クラス
+# ===============================================
+
+
+class TimestampEngine:
+    """日付列・時間列をまとめてタイムゾーン付きタイムスタンプ配列に変換
+
+    Excelシリアル値・datetime・文字列に対応する。
+    型が揃った列はpandasで一括変換し、それ以外はユニーク値ごとに解析してキャッシュする。
+    """
+
+    EXCEL_EPOCH_NS = int(pd.Timestamp("1899-12-30").value)  # Excelのバグ対応
+    NS_PER_DAY = 86_400 * 10**9
+    NAT = np.iinfo(np.int64).min  # NaTの内部表現
+
+    NUMERIC_KINDS = ("integer", "floating", "mixed-integer-float", "decimal")
+    DATETIME_KINDS = ("datetime", "datetime64", "date")
+
+    def __init__(self, source_timezone: str, cache_size: int = 100_000):
+        self.source_timezone = source_timezone
+        self.cache_size = cache_size
+        self._date_cache: Dict[object, int] = {}
+        self._time_cache: Dict[object, int] = {}
+
+    def convert(self, date_values, time_values) -> pd.DatetimeIndex:
+        """日付・時間の配列からタイムスタンプ配列を作成（変換できない行はNaT）"""
+        date_ns = self._dates_to_ns(np.asarray(date_values, dtype=object))
+        time_ns = self._times_to_ns(np.asarray(time_values, dtype=object))
+
+        invalid = (date_ns == self.NAT) | (time_ns == self.NAT)
+        local_ns = date_ns[~invalid] + time_ns[~invalid]
+
+        # 有効な行だけにタイムゾーンを付与（NaTが混ざると重複時刻を推定できない）
+        utc_ns = np.full(len(invalid), self.NAT, dtype=np.int64)
+        utc_ns[~invalid] = self._localize(
+            pd.DatetimeIndex(local_ns.view("datetime64[ns]"))).as_unit("ns").asi8
+
+        return pd.DatetimeIndex(utc_ns.view("datetime64[ns]")).tz_localize(
+            "UTC").tz_convert(self.source_timezone)
+
+    def _localize(self, local_times: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        """現地時刻にタイムゾーンを付与（夏時間の切替を考慮）
+
+        存在しない時刻（夏時間開始）は切替後の時刻に進める。
+        重複する時刻（夏時間終了）は時系列順の並びから前半・後半を推定する。
+        重複区間の片側しか含まれず推定できない場合（チャンクの境目など）は標準時とみなす。
+        """
         try:
-            with self.conn.cursor() as cur:
-                # 優先度順に更新
-                views_to_refresh = [
-                    'mv_power_1min',
-                    'mv_temp_1min',
-                    'mv_humid_5min',
-                    'mv_temp_5min',
-                    'mv_integrated_power_30min'
-                ]
-
-                for view in views_to_refresh:
-                    cur.execute(
-                        f"REFRESH MATERIALIZED VIEW {view}")
-                    logger.info(f"更新完了: {view}")
-
-            self.conn.commit()
-        except Exception as e:
-            logger.error(f"MV更新エラー: {e}")
-            self.conn.rollback()
+            return local_times.tz_localize(
+                self.source_timezone, ambiguous="infer", nonexistent="shift_forward")
+        except Exception:
+            # pandas/pytzのバージョンにより例外型が異なる
+            return local_times.tz_localize(
+                self.source_timezone, ambiguous=False, nonexistent="shift_forward")
+
+    def _dates_to_ns(self, values: np.ndarray) -> np.ndarray:
+        """日付配列を0時0分のエポックナノ秒に変換"""
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+
+        if kind in self.NUMERIC_KINDS:
+            days = np.floor(self._to_float(values))
+            return self._float_to_ns(days, self.NS_PER_DAY, self.EXCEL_EPOCH_NS)
+        if kind in self.DATETIME_KINDS:
+            return self._to_naive_index(values).normalize().asi8
+
+        return self._lookup(values, self._date_cache, self._parse_date)
+
+    def _times_to_ns(self, values: np.ndarray) -> np.ndarray:
+        """時間配列を0時からの経過ナノ秒に変換"""
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+
+        if kind in self.NUMERIC_KINDS:
+            # Excelの時間（0-1の小数）をマイクロ秒単位で丸める
+            fraction = np.mod(self._to_float(values), 1.0)
+            return self._float_to_ns(np.round(fraction * 86_400 * 10**6), 1_000)
+        if kind in self.DATETIME_KINDS:
+            index = self._to_naive_index(values)
+            return np.where(index.isna(), self.NAT,
+                            (index - index.normalize()).asi8)
+
+        return self._lookup(values, self._time_cache, self._parse_time)
+
+    def _to_float(self, values: np.ndarray) -> np.ndarray:
+        """数値配列への変換（欠損はNaN）"""
+        return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+
+    def _float_to_ns(self, values: np.ndarray, scale: int, offset: int = 0) -> np.ndarray:
+        """整数化済みの浮動小数配列をナノ秒に変換（NaNはNaT）"""
+        missing = np.isnan(values)
+        ns = np.nan_to_num(values).astype(np.int64) * scale + offset
+        return np.where(missing, self.NAT, ns)
+
+    def _to_naive_index(self, values: np.ndarray) -> pd.DatetimeIndex:
+        """datetime配列をタイムゾーンなしのDatetimeIndexに変換"""
+        index = pd.DatetimeIndex(pd.to_datetime(values, errors="coerce")).as_unit("ns")
+        if index.tz is not None:
+            index = index.tz_convert(self.source_timezone).tz_localize(None)
+        return index
+
+    def _lookup(self, values: np.ndarray, cache: Dict[object, int], parser) -> np.ndarray:
+        """ユニーク値ごとに解析し、結果をキャッシュして配列に展開"""
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+
+        if len(cache) + len(uniques) > self.cache_size:
+            cache.clear()
+
+        # キャッシュは複数スレッドで共有するため、読み戻さずローカル変数の値を使う
+        parsed = np.empty(len(uniques) + 1, dtype=np.int64)
+        for i, value in enumerate(uniques):
+            parsed_value = cache.get(value)
+            if parsed_value is None:
+                parsed_value = parser(value)
+                cache[value] = parsed_value
+            parsed[i] = parsed_value
+        parsed[-1] = self.NAT  # 欠損（コード-1）
+
+        return parsed[codes]
+
+    def _parse_date(self, value) -> int:
+        """単一の日付値を解析"""
+        try:
+            if isinstance(value, bool) or value == "":
+                return self.NAT
+            if isinstance(value, (int, float)):
+                return self.EXCEL_EPOCH_NS + int(np.floor(value)) * self.NS_PER_DAY
+            if isinstance(value, (datetime, date)):
+                return self._to_naive_index([value]).normalize().asi8[0]
+            return pd.Timestamp(str(value).strip()).normalize().value
+        except (ValueError, TypeError, OverflowError):
+            return self.NAT
+
+    def _parse_time(self, value) -> int:
+        """単一の時間値を解析"""
+        try:
+            if isinstance(value, bool) or value == "":
+                return self.NAT
+            if isinstance(value, (int, float)):
+                return int(round((value % 1.0) * 86_400 * 10**6)) * 1_000
+            if isinstance(value, datetime):
+                value = value.time()
+            if isinstance(value, dt_time):
+                seconds = value.hour * 3600 + value.minute * 60 + value.second
+                return (seconds * 10**6 + value.microsecond) * 1_000
+            if isinstance(value, timedelta):
+                return pd.Timedelta(value).value
+
+            # 文字列（HH:MM[:SS[.ffffff]]）
+            time_parts = str(value).strip().split(':')
+            hours = int(time_parts[0])
+            minutes = int(time_parts[1]) if len(time_parts) > 1 else 0
+            seconds = float(time_parts[2]) if len(time_parts) > 2 else 0.0
+            micros = round((hours * 3600 + minutes * 60 + seconds) * 10**6)
+            return int(micros) * 1_000
+        except (ValueError, TypeError, OverflowError):
+            return self.NAT
 
 # ===============================================
 # Excel/CSVファイル処理クラス
@@ -202,18 +813,40 @@ class DatabaseManager:
 class DataFileProcessor:
     """データファイル処理"""
 
-    def __init__(self, config: Config, db_manager: DatabaseManager):
+    def __init__(self, config: Config, db_manager: DatabaseManager,
+                 claim_manager: ClaimManager):
         self.config = config
         self.db_manager = db_manager
+        self.claim_manager = claim_manager
+        self.timestamp_engine = TimestampEngine(config.source_timezone)
 
     def process_file(self, file_path: str) -> bool:
-        """ファイル処理のメインメソッド"""
+        """ファイル処理のメインメソッド（占有できたファイルのみ処理）"""
+        try:
+            file_key = self.claim_manager.claim(file_path)
+        except Exception as e:
+            logger.error(f"ファイル占有エラー: {file_path} - {e}")
+            return False
+        if file_key is None:
+            return False
+
+        succeeded = self._process_claimed_file(file_path, file_key)
+
+        try:
+            self.claim_manager.release(file_key, succeeded)
+        except Exception as e:
+            # 解放できなかった占有はリース失効後に再走査で整理される
+            logger.error(f"占有解放エラー: {file_path} - {e}")
+        return succeeded
+
+    def _process_claimed_file(self, file_path: str, file_key: str) -> bool:
+        """占有済みファイルの処理"""
         logger.info(f"ファイル処理開始: {file_path}")
 
         try:
             # ファイル拡張子で処理を分岐
             if file_path.endswith('.xlsx'):
-                data = self._read_excel_file(file_path)
+                data = self._read_excel_file(file_path, file_key)
             elif file_path.endswith('.csv'):
                 data = self._read_csv_file(file_path)
             else:
@@ -222,22 +855,30 @@ class DataFileProcessor:
             # データをデータベースに保存
             self._save_to_database(data)
 
-            # データ処理後にMVを更新
-            self.db_manager.refresh_materialized_views()
-
-            # 処理済みフォルダに移動
+            # 処理済みフォルダに移動（リースを失っていれば再占有した側に任せる）
+            self.claim_manager.check_lease(file_key)
             self._move_processed_file(file_path)
 
             logger.info(f"ファイル処理完了: {file_path}")
             return True
 
+        except LeaseLostError as e:
+            logger.warning(f"ファイル処理を中断: {file_path} - {e}")
+            return False
+
         except Exception as e:
             logger.error(f"ファイル処理エラー: {file_path} - {e}")
             logger.error(traceback.format_exc())
-            self._move_error_file(file_path)
+            try:
+                self.claim_manager.check_lease(file_key)
+                self._move_error_file(file_path)
+            except LeaseLostError as lease_error:
+                logger.warning(f"エラーファイルを移動しません: {file_path} - {lease_error}")
+            except FileNotFoundError:
+                logger.warning(f"ファイルは既に移動されていました: {file_path}")
             return False
 
-    def _read_excel_file(self, file_path: str) -> List[MeasurementData]:
+    def _read_excel_file(self, file_path: str, file_key: str) -> List[MeasurementData]:
         """Excelファイルの読み込み"""
         measurements = []
 
@@ -268,24 +909,66 @@ class DataFileProcessor:
         logger.info(f"{len(tag_codes)}個の有効なタグを発見")
 
         # データ行の処理（40行目以降）
+        # タイムスタンプは行をまとめて変換し、1チャンクの測定数がおよそbatch_sizeになるようにする
+        rows_per_chunk = max(1, self.config.batch_size // max(len(tag_codes), 1))
         row_count = 0
-        for row in ws.iter_rows(min_row=self.config.data_start_row, values_only=True):
-            # 日付と時間の取得
-            date_value = row[0]  # A列
-            time_value = row[1]  # B列
+        chunk = []
+        chunk_start = self.config.data_start_row
+        for row_number, row in enumerate(
+                ws.iter_rows(min_row=self.config.data_start_row, values_only=True),
+                start=self.config.data_start_row):
+            if not chunk:
+                chunk_start = row_number
+            chunk.append(row)
+            if len(chunk) < rows_per_chunk:
+                continue
+
+            row_count += self._process_rows(chunk, chunk_start, tag_codes, measurements)
+            chunk = []
+
+            # バッチ処理
+            if len(measurements) >= self.config.batch_size:
+                self._flush_measurements(measurements, file_key)
+                measurements = []
+
+        if chunk:
+            row_count += self._process_rows(chunk, chunk_start, tag_codes, measurements)
 
-            # 日付/時間がない場合はスキップ
-            if not date_value or not time_value:
+        # 残りのデータを挿入
+        if measurements:
+            self._flush_measurements(measurements, file_key)
+
+        wb.close()
+        logger.info(f"{row_count}行を処理しました")
+
+        return measurements
+
+    def _process_rows(self, rows: List[tuple], first_row: int, tag_codes: Dict[int, Dict],
+                      measurements: List[MeasurementData]) -> int:
+        """データ行のチャンクを測定データに変換し、処理した行数を返す"""
+        # 日付と時間の取得（A列・B列）
+        date_values = [row[0] if len(row) > 0 else None for row in rows]
+        time_values = [row[1] if len(row) > 1 else None for row in rows]
+
+        # タイムスタンプの一括作成
+        timestamps = self.timestamp_engine.convert(date_values, time_values)
+        invalid = timestamps.isna()
+        timestamps = timestamps.to_pydatetime()
+
+        row_count = 0
+        for i, row in enumerate(rows):
+            # 日付/時間がない場合はスキップ（時間0.0は0時として扱う）
+            if date_values[i] in (None, "") or time_values[i] in (None, ""):
                 continue
 
-            # タイムスタンプの作成
-            try:
-                timestamp = self._create_timestamp(date_value, time_value)
-            except Exception as e:
+            if invalid[i]:
                 logger.warning(
-                    f"タイムスタンプ作成エラー（行{row_count + self.config.data_start_row}）: {e}")
+                    f"タイムスタンプ作成エラー（行{first_row + i}）: "
+                    f"date={date_values[i]!r}, time={time_values[i]!r}")
                 continue
 
+            timestamp = timestamps[i]
+
             # 各タグの値を処理
             for col_idx, tag_info in tag_codes.items():
                 try:
@@ -322,23 +1005,16 @@ class DataFileProcessor:
 
                 except Exception as e:
                     logger.debug(
-                        f"値処理エラー（行{row_count + self.config.data_start_row}, 列{col_idx}）: {e}")
+                        f"値処理エラー（行{first_row + i}, 列{col_idx}）: {e}")
 
             row_count += 1
 
-            # バッチ処理
-            if len(measurements) >= self.config.batch_size:
-                self.db_manager.insert_measurements(measurements)
-                measurements = []
-
-        # 残りのデータを挿入
-        if measurements:
-            self.db_manager.insert_measurements(measurements)
-
-        wb.close()
-        logger.info(f"{row_count}行を処理しました")
+        return row_count
 
-        return measurements
+    def _flush_measurements(self, measurements: List[MeasurementData], file_key: str):
+        """測定データと部分集計をデータベースへ書き込み（リース保持を確認してから）"""
+        self.claim_manager.check_lease(file_key)
+        self.db_manager.insert_measurements(measurements)
 
     def _read_csv_file(self, file_path: str) -> List[MeasurementData]:
         """CSVファイルの読み込み（将来の実装用）"""
@@ -346,46 +1022,6 @@ class DataFileProcessor:
         # pandasを使用して効率的に読み込む
         raise NotImplementedError("CSV処理は未実装です")
 
-    def _create_timestamp(self, date_value, time_value) -> datetime:
-        """日付と時間からタイムスタンプを作成"""
-        # Excelの日付シリアル値の場合
-        if isinstance(date_value, (int, float)):
-            # Excel基準日（1900-01-01）からの日数
-            base_date = datetime(1899, 12, 30)  # Excelのバグ対応
-            date_obj = base_date + pd.Timedelta(days=int(date_value))
-        elif isinstance(date_value, datetime):
-            date_obj = date_value
-        else:
-            # 文字列の場合
-            date_obj = pd.to_datetime(str(date_value))
-
-        # 時間の処理
-        if isinstance(time_value, (int, float)):
-            # Excelの時間（0-1の小数）
-            hours = int(time_value * 24)
-            minutes = int((time_value * 24 - hours) * 60)
-            seconds = int(((time_value * 24 - hours) * 60 - minutes) * 60)
-        elif isinstance(time_value, datetime):
-            hours = time_value.hour
-            minutes = time_value.minute
-            seconds = time_value.second
-        else:
-            # 文字列の場合
-            time_parts = str(time_value).split(':')
-            hours = int(time_parts[0])
-            minutes = int(time_parts[1]) if len(time_parts) > 1 else 0
-            seconds = int(time_parts[2]) if len(time_parts) > 2 else 0
-
-        # タイムスタンプの作成（タイムゾーン付き）
-        timestamp = date_obj.replace(
-            hour=hours,
-            minute=minutes,
-            second=seconds,
-            tzinfo=timezone.utc
-        )
-
-        return timestamp
-
     def _save_to_database(self, measurements: List[MeasurementData]):
         """データベースへの保存（既にinsert_measurementsで処理済み）"""
         pass
@@ -468,9 +1104,12 @@ class IoTDataProcessor:
     def __init__(self, config: Config):
         self.config = config
         self.db_manager = DatabaseManager(config)
-        self.processor = DataFileProcessor(config, self.db_manager)
+        self.claim_manager = ClaimManager(config)
+        self.processor = DataFileProcessor(
+            config, self.db_manager, self.claim_manager)
         self.file_watcher = FileWatcher(self.processor, config)
         self.observer = Observer()
+        self.last_refreshed_completion = None  # MV更新に反映済みの最終完了時刻
 
     def start(self):
         """アプリケーション開始"""
@@ -484,6 +1123,7 @@ class IoTDataProcessor:
 
         # データベース接続
         self.db_manager.connect()
+        self.claim_manager.connect()
 
         # ファイル監視開始
         self.observer.schedule(
@@ -499,9 +1139,19 @@ class IoTDataProcessor:
             # 既存ファイルの処理
             self._process_existing_files()
 
-            # 監視を継続
+            # 監視を継続（取りこぼし・リース失効ファイルの再走査とMV更新）
+            last_sweep = last_refresh = time.monotonic()
             while True:
                 time.sleep(1)
+                now = time.monotonic()
+
+                if now - last_sweep >= self.config.claim_sweep_interval:
+                    self._process_existing_files()
+                    last_sweep = now
+
+                if now - last_refresh >= self.config.mv_refresh_interval:
+                    self._refresh_if_leader()
+                    last_refresh = now
 
         except KeyboardInterrupt:
             logger.info("終了シグナルを受信しました")
@@ -514,17 +1164,48 @@ class IoTDataProcessor:
 
         self.observer.stop()
         self.observer.join()
+        self.claim_manager.disconnect()
         self.db_manager.disconnect()
 
     def _process_existing_files(self):
         """既存ファイルの処理"""
         watch_path = Path(self.config.watch_directory)
 
-        for file_path in watch_path.iterdir():
+        try:
+            file_paths = list(watch_path.iterdir())
+        except OSError as e:
+            logger.error(f"監視フォルダの走査エラー: {e}")
+            return
+
+        for file_path in file_paths:
             if file_path.is_file() and any(str(file_path).endswith(ext)
                                            for ext in self.config.file_extensions):
-                logger.info(f"既存ファイル発見: {file_path}")
-                self.processor.process_file(str(file_path))
+                try:
+                    # 書き込み途中のファイルは次回の走査に回す
+                    if time.time() - file_path.stat().st_mtime < self.config.file_settle_seconds:
+                        continue
+
+                    logger.debug(f"既存ファイル候補: {file_path}")
+                    self.processor.process_file(str(file_path))
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    logger.error(f"既存ファイルの処理エラー: {file_path} - {e}")
+
+    def _refresh_if_leader(self):
+        """リーダーのみ、新たな処理完了があればMVを更新"""
+        try:
+            if not self.claim_manager.try_become_leader():
+                return
+
+            latest = self.claim_manager.latest_completion()
+            if latest is None or latest == self.last_refreshed_completion:
+                return
+
+            self.db_manager.refresh_materialized_views()
+            self.last_refreshed_completion = latest
+        except Exception as e:
+            logger.error(f"MV更新判定エラー: {e}")
 
 # ===============================================
 # エントリーポイント
@@ -0,0 +1,73 @@
+SET CLIENT_ENCODING TO 'UTF8';
+-- =========================
+-- 集計テーブルの初期投入（既存環境の移行用）
+-- measurementsから全バケットを再計算する。再実行しても結果は同じ
+-- =========================
+CREATE TABLE IF NOT EXISTS agg_measurements_1min (
+    time_bucket TIMESTAMPTZ NOT NULL,
+    tag_id INT NOT NULL,
+    sample_count BIGINT NOT NULL,
+    mean_value DOUBLE PRECISION NOT NULL,
+    m2_value DOUBLE PRECISION NOT NULL,  -- 偏差平方和
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (time_bucket, tag_id)
+);
+CREATE TABLE IF NOT EXISTS agg_measurements_5min (
+    time_bucket TIMESTAMPTZ NOT NULL,
+    tag_id INT NOT NULL,
+    sample_count BIGINT NOT NULL,
+    mean_value DOUBLE PRECISION NOT NULL,
+    m2_value DOUBLE PRECISION NOT NULL,  -- 偏差平方和
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (time_bucket, tag_id)
+);
+
+-- 1分
+INSERT INTO agg_measurements_1min (time_bucket, tag_id, sample_count,
+                                   mean_value, m2_value, min_value, max_value)
+SELECT
+    DATE_TRUNC('minute', m.timestamp) AS time_bucket,
+    m.tag_id,
+    COUNT(*),
+    AVG(m.value),
+    VAR_POP(m.value) * COUNT(*),
+    MIN(m.value),
+    MAX(m.value)
+FROM measurements m
+GROUP BY 1, 2
+ON CONFLICT (time_bucket, tag_id) DO UPDATE
+SET sample_count = EXCLUDED.sample_count,
+    mean_value = EXCLUDED.mean_value,
+    m2_value = EXCLUDED.m2_value,
+    min_value = EXCLUDED.min_value,
+    max_value = EXCLUDED.max_value;
+
+-- 5分
+INSERT INTO agg_measurements_5min (time_bucket, tag_id, sample_count,
+                                   mean_value, m2_value, min_value, max_value)
+SELECT
+    to_timestamp(floor(extract(epoch from m.timestamp)/300)*300) AS time_bucket,
+    m.tag_id,
+    COUNT(*),
+    AVG(m.value),
+    VAR_POP(m.value) * COUNT(*),
+    MIN(m.value),
+    MAX(m.value)
+FROM measurements m
+GROUP BY 1, 2
+ON CONFLICT (time_bucket, tag_id) DO UPDATE
+SET sample_count = EXCLUDED.sample_count,
+    mean_value = EXCLUDED.mean_value,
+    m2_value = EXCLUDED.m2_value,
+    min_value = EXCLUDED.min_value,
+    max_value = EXCLUDED.max_value;
+
+-- =========================
+-- マテリアライズド・ビューの更新
+-- =========================
+REFRESH MATERIALIZED VIEW mv_temp_1min;
+REFRESH MATERIALIZED VIEW mv_temp_5min;
+REFRESH MATERIALIZED VIEW mv_humid_5min;
+REFRESH MATERIALIZED VIEW mv_power_1min;
@@ -48,3 +48,11 @@ CREATE INDEX idx_mv_power_1min_time ON mv_power_1min(time_bucket DESC, building_
 CREATE INDEX idx_mv_power_1min_building ON mv_power_1min(building_id, floor, time_bucket DESC);
 -- 積算電力
 CREATE INDEX idx_mv_integrated_power_30min_time ON mv_integrated_power_30min(half_hour_bucket DESC, building_id);
+
+-- =========================
+-- 集計テーブル
+-- =========================
+CREATE INDEX idx_agg_measurements_1min_tag_time ON agg_measurements_1min(tag_id, time_bucket DESC);
+CREATE INDEX idx_agg_measurements_5min_tag_time ON agg_measurements_5min(tag_id, time_bucket DESC);
+-- ファイル処理の排他制御
+CREATE INDEX idx_file_claims_finished ON file_claims(status, finished_at DESC);
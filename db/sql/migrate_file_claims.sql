@@ -0,0 +1,19 @@
+SET CLIENT_ENCODING TO 'UTF8';
+-- =========================
+-- ファイル処理の排他制御テーブルの追加（既存環境の移行用）
+-- 再実行しても結果は同じ
+-- =========================
+CREATE TABLE IF NOT EXISTS file_claims (
+    file_key TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'processing',
+    attempts INT NOT NULL DEFAULT 1,
+    claimed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    lease_expires_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ,
+    CONSTRAINT chk_file_claims_status CHECK (status IN ('processing', 'done', 'error'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_file_claims_finished ON file_claims(status, finished_at DESC);
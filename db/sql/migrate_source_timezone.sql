@@ -0,0 +1,46 @@
+SET CLIENT_ENCODING TO 'UTF8';
+-- =========================
+-- 測定時刻のタイムゾーン補正（既存環境の移行用、1回だけ実行）
+-- 旧バージョンはロガーの現地時刻をUTCとして格納していたため（Asia/Tokyoでは9時間後にずれる）、
+-- source_timezone の時刻として解釈し直し、集計テーブルを作り直す。
+-- 新バージョンの処理インスタンスを起動する前に実行すること（起動後に取り込んだ行まで補正してしまう）。
+-- 実行例: psql -v ON_ERROR_STOP=1 -v source_timezone=Asia/Tokyo -f db/sql/migrate_source_timezone.sql
+-- 補正後の時刻がパーティション範囲（partition.sql）外になる行があるとエラーで中止される。
+-- =========================
+\if :{?source_timezone}
+\else
+\set source_timezone 'Asia/Tokyo'
+\endif
+
+CREATE TABLE IF NOT EXISTS migration_history (
+    migration_name TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+BEGIN;
+
+-- 二重実行の防止（適用済みなら主キー違反で中止）
+INSERT INTO migration_history (migration_name) VALUES ('source_timezone');
+
+CREATE TEMP TABLE measurements_corrected ON COMMIT DROP AS
+SELECT
+    (m.timestamp AT TIME ZONE 'UTC') AT TIME ZONE :'source_timezone' AS timestamp,
+    m.tag_id,
+    m.value
+FROM measurements m;
+
+TRUNCATE measurements;
+
+-- 夏時間のある地域では戻りの1時間が同じ時刻に重なるため、重複は1行に寄せる
+INSERT INTO measurements (timestamp, tag_id, value)
+SELECT timestamp, tag_id, value
+FROM measurements_corrected
+ON CONFLICT (timestamp, tag_id) DO NOTHING;
+
+-- 旧時刻のバケットを残さないよう集計を空にしてから再計算する
+TRUNCATE agg_measurements_1min, agg_measurements_5min;
+
+COMMIT;
+
+-- 集計テーブルの再計算とMV更新
+\ir backfill_aggregate.sql
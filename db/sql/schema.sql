@@ -56,3 +56,53 @@ CREATE TABLE measurements (
     value DOUBLE PRECISION NOT NULL,
     PRIMARY KEY (timestamp, tag_id)
 ) PARTITION BY RANGE (timestamp);
+
+-- 集計データ（取込時の部分集計、1分）
+DROP TABLE IF EXISTS agg_measurements_1min CASCADE;
+CREATE TABLE agg_measurements_1min (
+    time_bucket TIMESTAMPTZ NOT NULL,
+    tag_id INT NOT NULL,
+    sample_count BIGINT NOT NULL,
+    mean_value DOUBLE PRECISION NOT NULL,
+    m2_value DOUBLE PRECISION NOT NULL,  -- 偏差平方和
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (time_bucket, tag_id)
+);
+
+-- 集計データ（取込時の部分集計、5分）
+DROP TABLE IF EXISTS agg_measurements_5min CASCADE;
+CREATE TABLE agg_measurements_5min (
+    time_bucket TIMESTAMPTZ NOT NULL,
+    tag_id INT NOT NULL,
+    sample_count BIGINT NOT NULL,
+    mean_value DOUBLE PRECISION NOT NULL,
+    m2_value DOUBLE PRECISION NOT NULL,  -- 偏差平方和
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (time_bucket, tag_id)
+);
+
+-- ファイル処理の排他制御（複数インスタンス間）
+DROP TABLE IF EXISTS file_claims CASCADE;
+CREATE TABLE file_claims (
+    file_key TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'processing',
+    attempts INT NOT NULL DEFAULT 1,
+    claimed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    lease_expires_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ,
+    CONSTRAINT chk_file_claims_status CHECK (status IN ('processing', 'done', 'error'))
+);
+
+-- 移行スクリプトの適用履歴
+DROP TABLE IF EXISTS migration_history CASCADE;
+CREATE TABLE migration_history (
+    migration_name TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+-- 新規構築では測定時刻は最初から source_timezone で格納されるため、補正は適用済み扱い
+INSERT INTO migration_history (migration_name) VALUES ('source_timezone');
@@ -4,112 +4,212 @@ SET CLIENT_ENCODING TO 'UTF8';
 -- =========================
 -- 温度
 CREATE MATERIALIZED VIEW mv_temp_1min AS
+WITH partials AS (
+    SELECT
+        a.time_bucket,
+        t.building_id,
+        b.building_name,
+        l.location_id,
+        l.location_name,
+        l.floor,
+        t.measure_type_id,
+        mt.measure_type_name,
+        a.sample_count,
+        a.mean_value,
+        a.m2_value,
+        a.min_value,
+        a.max_value,
+        SUM(a.sample_count * a.mean_value) OVER w / SUM(a.sample_count) OVER w AS group_mean
+    FROM agg_measurements_1min a
+    JOIN tags t ON a.tag_id = t.tag_id
+    JOIN buildings b ON t.building_id = b.building_id
+    JOIN locations l ON t.location_id = l.location_id
+    JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
+    WHERE
+        t.is_active = TRUE
+        AND mt.measure_type_name IN ('温度')
+        AND a.time_bucket >= CURRENT_DATE - INTERVAL '2 years'
+    WINDOW w AS (PARTITION BY a.time_bucket, t.building_id, l.location_id, t.measure_type_id)
+)
 SELECT
-    DATE_TRUNC('minute', m.timestamp) AS time_bucket,
-    t.building_id,
-    b.building_name,
-    l.location_id,
-    l.location_name,
-    l.floor,
-    t.measure_type_id,
-    mt.measure_type_name,
-    AVG(m.value) AS avg_value,
-    MIN(m.value) AS min_value,
-    MAX(m.value) AS max_value,
-    COUNT(*) AS sample_count,
-    STDDEV(m.value) AS stddev_value
-FROM measurements m
-JOIN tags t ON m.tag_id = t.tag_id
-JOIN buildings b ON t.building_id = b.building_id
-JOIN locations l ON t.location_id = l.location_id
-JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
-WHERE
-    t.is_active = TRUE
-    AND mt.measure_type_name IN ('温度')
-    AND m.timestamp >= CURRENT_DATE - INTERVAL '2 years'
+    time_bucket,
+    building_id,
+    building_name,
+    location_id,
+    location_name,
+    floor,
+    measure_type_id,
+    measure_type_name,
+    MAX(group_mean) AS avg_value,
+    MIN(min_value) AS min_value,
+    MAX(max_value) AS max_value,
+    SUM(sample_count)::BIGINT AS sample_count,
+    -- 部分集計の結合（Chanの並列公式）による標本標準偏差
+    CASE
+        WHEN SUM(sample_count) > 1
+        THEN SQRT(
+            (SUM(m2_value) + SUM(sample_count * (mean_value - group_mean) ^ 2))
+            / (SUM(sample_count) - 1))
+    END AS stddev_value
+FROM partials
 GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
 WITH DATA;
 
 CREATE MATERIALIZED VIEW mv_temp_5min AS
+WITH partials AS (
+    SELECT
+        a.time_bucket,
+        t.building_id,
+        b.building_name,
+        l.location_id,
+        l.location_name,
+        l.floor,
+        t.measure_type_id,
+        mt.measure_type_name,
+        a.sample_count,
+        a.mean_value,
+        a.m2_value,
+        a.min_value,
+        a.max_value,
+        SUM(a.sample_count * a.mean_value) OVER w / SUM(a.sample_count) OVER w AS group_mean
+    FROM agg_measurements_5min a
+    JOIN tags t ON a.tag_id = t.tag_id
+    JOIN buildings b ON t.building_id = b.building_id
+    JOIN locations l ON t.location_id = l.location_id
+    JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
+    WHERE
+        t.is_active = TRUE
+        AND mt.measure_type_name IN ('温度')
+        AND a.time_bucket >= CURRENT_DATE - INTERVAL '2 years'
+    WINDOW w AS (PARTITION BY a.time_bucket, t.building_id, l.location_id, t.measure_type_id)
+)
 SELECT
-    to_timestamp(floor(extract(epoch from m.timestamp)/300)*300) AS time_bucket,
-    t.building_id,
-    b.building_name,
-    l.location_id,
-    l.location_name,
-    l.floor,
-    t.measure_type_id,
-    mt.measure_type_name,
-    AVG(m.value) AS avg_value,
-    MIN(m.value) AS min_value,
-    MAX(m.value) AS max_value,
-    COUNT(*) AS sample_count,
-    STDDEV(m.value) AS stddev_value
-FROM measurements m
-JOIN tags t ON m.tag_id = t.tag_id
-JOIN buildings b ON t.building_id = b.building_id
-JOIN locations l ON t.location_id = l.location_id
-JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
-WHERE
-    t.is_active = TRUE
-    AND mt.measure_type_name IN ('温度')
-    AND m.timestamp >= CURRENT_DATE - INTERVAL '2 years'
+    time_bucket,
+    building_id,
+    building_name,
+    location_id,
+    location_name,
+    floor,
+    measure_type_id,
+    measure_type_name,
+    MAX(group_mean) AS avg_value,
+    MIN(min_value) AS min_value,
+    MAX(max_value) AS max_value,
+    SUM(sample_count)::BIGINT AS sample_count,
+    -- 部分集計の結合（Chanの並列公式）による標本標準偏差
+    CASE
+        WHEN SUM(sample_count) > 1
+        THEN SQRT(
+            (SUM(m2_value) + SUM(sample_count * (mean_value - group_mean) ^ 2))
+            / (SUM(sample_count) - 1))
+    END AS stddev_value
+FROM partials
 GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
 WITH DATA;
 
 -- 湿度
 CREATE MATERIALIZED VIEW mv_humid_5min AS
+WITH partials AS (
+    SELECT
+        a.time_bucket,
+        t.building_id,
+        b.building_name,
+        l.location_id,
+        l.location_name,
+        l.floor,
+        t.measure_type_id,
+        mt.measure_type_name,
+        a.sample_count,
+        a.mean_value,
+        a.m2_value,
+        a.min_value,
+        a.max_value,
+        SUM(a.sample_count * a.mean_value) OVER w / SUM(a.sample_count) OVER w AS group_mean
+    FROM agg_measurements_5min a
+    JOIN tags t ON a.tag_id = t.tag_id
+    JOIN buildings b ON t.building_id = b.building_id
+    JOIN locations l ON t.location_id = l.location_id
+    JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
+    WHERE
+        t.is_active = TRUE
+        AND mt.measure_type_name IN ('湿度')
+        AND a.time_bucket >= CURRENT_DATE - INTERVAL '2 years'
+    WINDOW w AS (PARTITION BY a.time_bucket, t.building_id, l.location_id, t.measure_type_id)
+)
 SELECT
-    to_timestamp(floor(extract(epoch from m.timestamp)/300)*300) AS time_bucket,
-    t.building_id,
-    b.building_name,
-    l.location_id,
-    l.location_name,
-    l.floor,
-    t.measure_type_id,
-    mt.measure_type_name,
-    AVG(m.value) AS avg_value,
-    MIN(m.value) AS min_value,
-    MAX(m.value) AS max_value,
-    COUNT(*) AS sample_count,
-    STDDEV(m.value) AS stddev_value
-FROM measurements m
-JOIN tags t ON m.tag_id = t.tag_id
-JOIN buildings b ON t.building_id = b.building_id
-JOIN locations l ON t.location_id = l.location_id
-JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
-WHERE
-    t.is_active = TRUE
-    AND mt.measure_type_name IN ('湿度')
-    AND m.timestamp >= CURRENT_DATE - INTERVAL '2 years'
+    time_bucket,
+    building_id,
+    building_name,
+    location_id,
+    location_name,
+    floor,
+    measure_type_id,
+    measure_type_name,
+    MAX(group_mean) AS avg_value,
+    MIN(min_value) AS min_value,
+    MAX(max_value) AS max_value,
+    SUM(sample_count)::BIGINT AS sample_count,
+    -- 部分集計の結合（Chanの並列公式）による標本標準偏差
+    CASE
+        WHEN SUM(sample_count) > 1
+        THEN SQRT(
+            (SUM(m2_value) + SUM(sample_count * (mean_value - group_mean) ^ 2))
+            / (SUM(sample_count) - 1))
+    END AS stddev_value
+FROM partials
 GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
 WITH DATA;
 
 -- 電力
 CREATE MATERIALIZED VIEW mv_power_1min AS
+WITH partials AS (
+    SELECT
+        a.time_bucket,
+        t.building_id,
+        b.building_name,
+        l.location_id,
+        l.location_name,
+        l.floor,
+        t.measure_type_id,
+        mt.measure_type_name,
+        a.sample_count,
+        a.mean_value,
+        a.m2_value,
+        a.min_value,
+        a.max_value,
+        SUM(a.sample_count * a.mean_value) OVER w / SUM(a.sample_count) OVER w AS group_mean
+    FROM agg_measurements_1min a
+    JOIN tags t ON a.tag_id = t.tag_id
+    JOIN buildings b ON t.building_id = b.building_id
+    JOIN locations l ON t.location_id = l.location_id
+    JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
+    WHERE
+        t.is_active = TRUE
+        AND mt.measure_type_name IN ('電力')
+        AND a.time_bucket >= CURRENT_DATE - INTERVAL '2 years'
+    WINDOW w AS (PARTITION BY a.time_bucket, t.building_id, l.location_id, t.measure_type_id)
+)
 SELECT
-    DATE_TRUNC('minute', m.timestamp) AS time_bucket,
-    t.building_id,
-    b.building_name,
-    l.location_id,
-    l.location_name,
-    l.floor,
-    t.measure_type_id,
-    mt.measure_type_name,
-    AVG(m.value) AS avg_value,
-    MIN(m.value) AS min_value,
-    MAX(m.value) AS max_value,
-    COUNT(*) AS sample_count,
-    STDDEV(m.value) AS stddev_value
-FROM measurements m
-JOIN tags t ON m.tag_id = t.tag_id
-JOIN buildings b ON t.building_id = b.building_id
-JOIN locations l ON t.location_id = l.location_id
-JOIN measure_types mt ON t.measure_type_id = mt.measure_type_id
-WHERE
-    t.is_active = TRUE
-    AND mt.measure_type_name IN ('電力')
-    AND m.timestamp >= CURRENT_DATE - INTERVAL '2 years'
+    time_bucket,
+    building_id,
+    building_name,
+    location_id,
+    location_name,
+    floor,
+    measure_type_id,
+    measure_type_name,
+    MAX(group_mean) AS avg_value,
+    MIN(min_value) AS min_value,
+    MAX(max_value) AS max_value,
+    SUM(sample_count)::BIGINT AS sample_count,
+    -- 部分集計の結合（Chanの並列公式）による標本標準偏差
+    CASE
+        WHEN SUM(sample_count) > 1
+        THEN SQRT(
+            (SUM(m2_value) + SUM(sample_count * (mean_value - group_mean) ^ 2))
+            / (SUM(sample_count) - 1))
+    END AS stddev_value
+FROM partials
 GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
 WITH DATA;
 